@@ -0,0 +1,276 @@
+import asyncio
+import contextlib
+import functools
+import logging
+from array import array
+
+import orjson
+from blake3 import blake3
+
+import redis.asyncio as aioredis
+from openai import AsyncOpenAI, OpenAIError
+from redis.commands.search.field import TagField, VectorField
+try:
+    from redis.commands.search.index_definition import IndexDefinition, IndexType
+except ImportError:  # redis-py < 6
+    from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+from redis.exceptions import RedisError, ResponseError
+
+from src.common.hashing import KEY_BYTES
+from src.common.http import shared_async_client
+from src.context.schema import UserContext
+
+logger = logging.getLogger(__name__)
+
+redis = aioredis.Redis.from_url("redis://localhost:6379/0")
+embeddings = AsyncOpenAI(http_client=shared_async_client)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+SIMILARITY_THRESHOLD = 0.92
+PLAN_TTL = 3600  # 1h
+
+INDEX_NAME = "plan_cache_idx"
+EXACT_PREFIX = "plan:exact:"
+SEMANTIC_PREFIX = "plan:semantic:"
+KINDS_PREFIX = "plan:kinds:"
+
+# exact key -> plan being computed by the first caller
+_inflight: dict[str, asyncio.Future] = {}
+# Set once the search index is known to exist
+_index_ready = False
+
+@functools.cache
+def _static_hash():
+    # Model, prompt and schema only change when a step kind is
+    # registered: hash them once and only feed the context per call.
+    # Imported lazily: the planner imports this module
+    from src.behavior.planner import PLANNER_MODEL, planning_prompt, step_schema
+
+    payload = orjson.dumps(
+        {"m": PLANNER_MODEL, "p": planning_prompt(), "t": step_schema()},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return blake3(payload)
+
+def reset_static_hash():
+    # Called by the planner when its prompt or schema changes
+    _static_hash.cache_clear()
+
+def exact_key(context: UserContext, context_json: bytes | None = None) -> str:
+    digest = _static_hash().copy()
+    digest.update(context_json or context.to_json_bytes())
+    return digest.hexdigest(length=KEY_BYTES)
+
+async def get_or_select_kinds(context: UserContext, select_fn) -> list[str]:
+    """
+    Caches the planner's step-kind selection, which depends on the query
+    and the registered kinds only.
+    """
+    # Static hash covers the registered kinds: new kinds invalidate old picks
+    digest = _static_hash().copy()
+    digest.update(context.query.encode())
+    key = KINDS_PREFIX + digest.hexdigest(length=KEY_BYTES)
+    try:
+        cached = await redis.get(key)
+        if cached:
+            return orjson.loads(cached)
+    except (RedisError, orjson.JSONDecodeError):
+        logger.warning("Step-kind cache lookup failed", exc_info=True)
+
+    kinds = await select_fn(context)
+    try:
+        await redis.set(key, orjson.dumps(kinds), ex=PLAN_TTL)
+    except RedisError:
+        logger.warning("Step-kind cache store failed", exc_info=True)
+    return kinds
+
+def _tag(value: str) -> str:
+    # Hex digest: no TAG punctuation to escape, nothing to inject
+    return blake3(value.encode()).hexdigest(length=KEY_BYTES)
+
+async def _ensure_index():
+    global _index_ready
+    if _index_ready:
+        return
+    try:
+        await redis.ft(INDEX_NAME).info()
+    except ResponseError:
+        try:
+            await redis.ft(INDEX_NAME).create_index(
+                fields=[
+                    TagField("user_id"),
+                    TagField("industry"),
+                    VectorField(
+                        "embedding",
+                        "HNSW",
+                        {"TYPE": "FLOAT32", "DIM": EMBEDDING_DIM, "DISTANCE_METRIC": "COSINE"}
+                    )
+                ],
+                definition=IndexDefinition(prefix=[SEMANTIC_PREFIX], index_type=IndexType.HASH)
+            )
+        except ResponseError as e:
+            # Another worker created it first
+            if "already exists" not in str(e).lower():
+                raise
+    _index_ready = True
+
+async def _embed(text: str) -> bytes:
+    response = await embeddings.embeddings.create(model=EMBEDDING_MODEL, input=text)
+    return array("f", response.data[0].embedding).tobytes()
+
+async def _semantic_lookup(context: UserContext, vector: bytes):
+    await _ensure_index()
+    # Only reuse plans built for the same user and industry: plans carry
+    # tool arguments for the user they were built for
+    scope = f"@user_id:{{{_tag(context.user_id)}}} @industry:{{{_tag(context.industry)}}}"
+    query = (
+        Query(f"({scope})=>[KNN 1 @embedding $vec AS distance]")
+        .sort_by("distance")
+        .return_fields("plan", "distance")
+        .dialect(2)
+    )
+    result = await redis.ft(INDEX_NAME).search(query, query_params={"vec": vector})
+    if not result.docs:
+        return None
+    top = result.docs[0]
+    # COSINE distance is 1 - similarity
+    if 1 - float(top.distance) < SIMILARITY_THRESHOLD:
+        return None
+    return orjson.loads(top.plan)
+
+async def _lookup(context: UserContext, key: str):
+    # Best effort: a broken cache or embedding call must not fail planning
+    vector = None
+    try:
+        # 1. Exact hit: same model, prompt, context and schema
+        cached = await redis.get(EXACT_PREFIX + key)
+        if cached:
+            return orjson.loads(cached), None
+
+        # 2. Semantic hit: a near-identical query was planned recently
+        vector = await _embed(context.query)
+        return await _semantic_lookup(context, vector), vector
+    except (RedisError, OpenAIError, orjson.JSONDecodeError, ValueError):
+        # Also corrupt cached plans or distances: treat as a miss
+        logger.warning("Plan cache lookup failed; planning without it", exc_info=True)
+        return None, vector
+
+async def _store(context: UserContext, key: str, plan: dict, vector: bytes | None):
+    if vector is None:
+        try:
+            vector = await _embed(context.query)
+        except OpenAIError:
+            # Still worth caching the exact tier
+            logger.warning("Plan embedding failed; skipping semantic cache", exc_info=True)
+    plan_json = orjson.dumps(_without_usage(plan))
+
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(EXACT_PREFIX + key, plan_json, ex=PLAN_TTL)
+            if vector is not None:
+                # plan is a plain hash field: returned by searches, not indexed
+                pipe.hset(
+                    SEMANTIC_PREFIX + key,
+                    mapping={
+                        "user_id": _tag(context.user_id),
+                        "industry": _tag(context.industry),
+                        "plan": plan_json,
+                        "embedding": vector
+                    }
+                )
+                pipe.expire(SEMANTIC_PREFIX + key, PLAN_TTL)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Plan cache store failed", exc_info=True)
+
+def _without_usage(plan: dict) -> dict:
+    # Usage belongs to the call that built the plan, not to later hits
+    return {k: v for k, v in plan.items() if k != "usage"}
+
+class Flight:
+    """
+    One caller's place in the single-flight gate for an exact key.
+    plan is set when the cache or a concurrent caller already has it;
+    otherwise this caller leads and must hand its plan to store().
+    """
+    def __init__(self, context: UserContext, key: str, fut: asyncio.Future):
+        self.context = context
+        self.key = key
+        self.plan: dict | None = None
+        self.vector: bytes | None = None
+        self._fut = fut
+
+    async def store(self, plan: dict):
+        # Release followers first, then populate both tiers
+        self._fut.set_result(_without_usage(plan))
+        await _store(self.context, self.key, plan, self.vector)
+
+async def _follow(key: str) -> dict | None:
+    # Waits on the caller already planning this key. None means there
+    # is none (any more) and the current caller should lead.
+    while (fut := _inflight.get(key)) is not None:
+        try:
+            # Shielded: a cancelled follower must not cancel the leader's work
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            if not fut.cancelled():
+                raise  # this follower itself was cancelled
+            # The leader gave up (e.g. its client went away): retry
+    return None
+
+@contextlib.asynccontextmanager
+async def single_flight(context: UserContext, context_json: bytes | None = None):
+    """
+    Exact cache -> semantic cache -> caller's LLM call, with concurrent
+    callers for the same exact key sharing one lookup and one LLM call.
+    """
+    key = exact_key(context, context_json)
+    shared = await _follow(key)
+    if shared is not None:
+        flight = Flight(context, key, None)
+        flight.plan = shared
+        yield flight
+        return
+
+    # Leader. Registered before any await so later callers follow it.
+    fut = asyncio.get_running_loop().create_future()
+    # Mark errors as retrieved when nobody else was waiting
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight[key] = fut
+    flight = Flight(context, key, fut)
+    try:
+        flight.plan, flight.vector = await _lookup(context, key)
+        if flight.plan is not None:
+            fut.set_result(flight.plan)
+        yield flight
+    except (asyncio.CancelledError, GeneratorExit):
+        # Not an error in the plan: let a follower take over
+        fut.cancel()
+        raise
+    except Exception as e:
+        if not fut.done():
+            fut.set_exception(e)
+        raise
+    finally:
+        if not fut.done():
+            fut.cancel()  # leader returned without a plan
+        if _inflight.get(key) is fut:
+            del _inflight[key]
+
+async def get_or_compute(context: UserContext, compute_fn, context_json: bytes | None = None):
+    """
+    Exact cache -> semantic cache -> LLM.
+    Concurrent calls for the same exact key share one lookup/LLM call.
+    Returns the plan response as a dict, ready for Plan.from_response.
+    """
+    async with single_flight(context, context_json) as flight:
+        if flight.plan is not None:
+            return flight.plan
+
+        # Miss: call the LLM and populate both tiers
+        response = await compute_fn(context)
+        plan = response.model_dump(mode="json") if hasattr(response, "model_dump") else response
+        await flight.store(plan)
+        return plan
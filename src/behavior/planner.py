@@ -1,44 +1,399 @@
-from openai import OpenAI
+import asyncio
+import copy
+import functools
+import json
+import logging
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import orjson
+
+from openai import AsyncOpenAI, OpenAIError
+from pydantic import BaseModel, ConfigDict, Field
+from src.behavior import plan_cache
+from src.behavior.prompts import (
+    ARGUMENT_CONVENTIONS, CREATE_STEP_GUIDE, PLANNING_EXAMPLES, PLANNING_RULES
+)
+from src.common.http import shared_async_client
 from src.context.schema import UserContext
 
+logger = logging.getLogger(__name__)
+
+# Step kind -> JSON sub-schema for that kind of step. Read-only: add
+# kinds with register_step_kind so the prompt, tool schemas and plan
+# cache keys built from it follow.
+_step_kinds: dict[str, dict] = {}
+STEP_REGISTRY: Mapping[str, dict] = MappingProxyType(_step_kinds)
+
+# Added to every step kind: the tool the step runs
+STEP_TOOL = {"type": "string", "description": "Tool this step executes"}
+
+# Added to every step kind. Steps with no (or satisfied) dependencies
+# run concurrently.
+DEPENDS_ON = {
+    "type": "array",
+    "items": {"type": "integer"},
+    "description": "Indexes of earlier steps whose output this step needs"
+}
+
+def _with_common_fields(schema: dict) -> dict:
+    properties = {**schema.get("properties", {}), "tool": STEP_TOOL, "depends_on": DEPENDS_ON}
+    required = sorted({*schema.get("required", []), "tool"})
+    return {**schema, "properties": properties, "required": required}
+
+def _step_kind_schema(kind: str) -> dict:
+    return _with_common_fields(STEP_REGISTRY[kind])
+
 class StepSchema:
     @staticmethod
-    def model_json_schema(): return {}
+    def model_json_schema():
+        # No registered kinds (oneOf must not be empty): one generic step
+        if not STEP_REGISTRY:
+            return _with_common_fields({"type": "object"})
+        return {"oneOf": [_step_kind_schema(k) for k in STEP_REGISTRY]}
 
 class Plan:
+    class Step(BaseModel):
+        """One create_step call; kind-specific arguments are kept as extras."""
+        model_config = ConfigDict(extra="allow")
+        
+        tool: str
+        # Indexes of earlier steps this one must wait for
+        depends_on: list[int] = Field(default_factory=list)
+        
+        @classmethod
+        def parse(cls, arguments: dict) -> "Plan.Step":
+            return cls.model_validate(arguments)
+
     @staticmethod
-    def from_response(res): return res
+    def from_response(res):
+        # Accepts the raw OpenAI response or its cached dict form
+        if hasattr(res, "model_dump"):
+            res = res.model_dump(mode="json")
+        return res
+
+    @staticmethod
+    def cached_tokens(plan) -> int:
+        # Prompt tokens OpenAI served from its prefix cache
+        details = (plan.get("usage") or {}).get("prompt_tokens_details") or {}
+        return details.get("cached_tokens") or 0
+
+    @staticmethod
+    def steps_from(plan: dict):
+        # create_step tool calls, in order, from a dict-form plan
+        for choice in plan.get("choices") or []:
+            for call in choice["message"].get("tool_calls") or []:
+                if call["function"]["name"] == "create_step":
+                    yield Plan.Step.parse(orjson.loads(call["function"]["arguments"]))
+
+def _canonical(obj):
+    # Stable key order so identical schemas serialize to identical bytes
+    return json.loads(json.dumps(obj, sort_keys=True))
+
+PLANNER_MODEL = "gpt-5-mini"
+STEP_SCHEMA_VERSION = "1.0.0"
+
+# OpenAI only caches prompts whose prefix is at least this long
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+# Static-first: everything before the user message is identical across
+# calls so OpenAI's prompt cache can reuse it. Built on first use and
+# again after each register_step_kind.
+@functools.cache
+def planning_prompt() -> str:
+    preamble = "\n\n".join([
+        f"Step schema version: {STEP_SCHEMA_VERSION}",
+        PLANNING_RULES,
+        "Step kinds:\n" + json.dumps(_step_kinds, sort_keys=True, indent=2),
+        CREATE_STEP_GUIDE,
+        ARGUMENT_CONVENTIONS,
+        PLANNING_EXAMPLES
+    ])
+    prompt = "You are a deterministic planner...\n\n" + preamble
+    # Rough count (~4 characters per token): enough to notice the prefix
+    # shrinking below the cache threshold, at which point cached_tokens is 0
+    if len(prompt) // 4 < PROMPT_CACHE_MIN_TOKENS:
+        logger.warning(
+            "Planning prompt is ~%d tokens; OpenAI prompt caching needs %d",
+            len(prompt) // 4, PROMPT_CACHE_MIN_TOKENS
+        )
+    return prompt
 
-PLANNING_PROMPT = "You are a deterministic planner..."
+STEP_SELECTION_PROMPT = "List the step kinds needed to plan this request..."
 
-client = OpenAI()
+# One module-level client so keep-alive connections are pooled
+client = AsyncOpenAI(http_client=shared_async_client)
 
-def create_plan(context: UserContext) -> Plan:
+BATCH_POLL_INITIAL = 5  # seconds
+BATCH_POLL_MAX = 300
+
+def _step_tools(parameters: dict) -> list[dict]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "create_step",
+                "description": "Add a step to execution plan",
+                "parameters": _canonical(parameters)
+            }
+        }
+    ]
+
+# Built once per registry state: identical bytes on every call, no
+# per-call schema walk
+@functools.cache
+def step_schema() -> dict:
+    return _canonical(StepSchema.model_json_schema())
+
+@functools.cache
+def _cached_tools() -> list[dict]:
+    return _step_tools(step_schema())
+
+@functools.lru_cache(maxsize=256)
+def _trimmed_tools(kinds: tuple[str, ...]) -> list[dict]:
+    return _step_tools({"oneOf": [_step_kind_schema(k) for k in kinds]})
+
+@functools.cache
+def _select_tools() -> list[dict]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "select_step_kinds",
+                "description": "Pick the step kinds this request needs",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "kinds": {
+                            "type": "array",
+                            "items": {"enum": list(_step_kinds)}
+                        }
+                    },
+                    "required": ["kinds"]
+                }
+            }
+        }
+    ]
+
+def register_step_kind(kind: str, schema: dict):
     """
-    Layer 2: Behavior
-    Generates an inspectable plan without executing it.
+    Adds (or replaces) a step kind. The planning prompt, tool schemas and
+    plan-cache keys are rebuilt from the new registry on next use.
     """
-    
-    context_str = context.model_dump_json()
+    # Copied: later edits to the caller's dict must not bypass the rebuild
+    _step_kinds[kind] = copy.deepcopy(schema)
+    for built in (planning_prompt, step_schema, _cached_tools, _trimmed_tools, _select_tools):
+        built.cache_clear()
+    plan_cache.reset_static_hash()
 
-    response = client.chat.completions.create(
-        model="gpt-5-mini",
+def _plan_request_body(
+    context: UserContext,
+    tools: list[dict] | None = None,
+    context_json: bytes | None = None
+) -> dict:
+    context_str = (context_json or context.to_json_bytes()).decode()
+
+    return dict(
+        model=PLANNER_MODEL,
         messages=[
-            {"role": "system", "content": PLANNING_PROMPT},
+            {"role": "system", "content": planning_prompt()},
+            # Dynamic content last, after the cacheable prefix
             {"role": "user", "content": context_str}
         ],
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "create_step",
-                    "description": "Add a step to execution plan",
-                    "parameters": StepSchema.model_json_schema()
-                }
-            }
-        ],
+        tools=tools or _cached_tools(),
         tool_choice="auto" 
     )
+
+async def _select_step_kinds(context: UserContext) -> list[str]:
+    """
+    Cheap first pass: only step kind names, no step schemas.
+    """
+    response = await client.chat.completions.create(
+        model=PLANNER_MODEL,
+        messages=[
+            {"role": "system", "content": STEP_SELECTION_PROMPT},
+            {"role": "user", "content": context.query}
+        ],
+        tools=_select_tools(),
+        tool_choice={"type": "function", "function": {"name": "select_step_kinds"}}
+    )
+    call = response.choices[0].message.tool_calls[0]
+    kinds = orjson.loads(call.function.arguments).get("kinds", [])
+    return [k for k in kinds if k in STEP_REGISTRY]
+
+async def _request_plan(
+    context: UserContext,
+    stream: bool = False,
+    context_json: bytes | None = None
+):
+    tools = None
+    # Nothing to trim without registered kinds: skip the first pass
+    if STEP_REGISTRY:
+        # Second pass only inlines the sub-schemas picked by the first
+        try:
+            kinds = await plan_cache.get_or_select_kinds(context, _select_step_kinds)
+        except (OpenAIError, LookupError, TypeError, ValueError):
+            # The first pass only saves tokens: plan with the full schema
+            logger.warning("Step-kind selection failed; sending all step kinds", exc_info=True)
+            kinds = []
+        # Registry order, so the same kind set always yields the same tool bytes
+        kinds = tuple(k for k in STEP_REGISTRY if k in kinds)
+        tools = _trimmed_tools(kinds) if kinds else None
+    body = _plan_request_body(context, tools, context_json)
+    if stream:
+        body.update(stream=True, stream_options={"include_usage": True})
+    return await client.chat.completions.create(**body)
+
+async def create_plan(context: UserContext, context_json: bytes | None = None) -> Plan:
+    """
+    Layer 2: Behavior
+    Generates an inspectable plan without executing it.
+    Repeated plans are served from the exact/semantic plan cache.
+    Pass context_json (context.to_json_bytes()) if the caller already has it.
+    """
+    # Serialized once for both the LLM call and the cache key
+    context_json = context_json or context.to_json_bytes()
+    response = await plan_cache.get_or_compute(
+        context,
+        functools.partial(_request_plan, context_json=context_json),
+        context_json
+    )
     
     # Plan is now inspectable, not hidden in tool calls
-    return Plan.from_response(response)
\ No newline at end of file
+    return Plan.from_response(response)
+
+def _parse_arguments(buffer: str):
+    try:
+        return orjson.loads(buffer)
+    except orjson.JSONDecodeError:
+        return None
+
+async def stream_plan(
+    context: UserContext,
+    plan: dict | None = None,
+    context_json: bytes | None = None
+):
+    """
+    Streaming variant of create_plan.
+    Yields each step as soon as its create_step arguments are complete,
+    so execution can start before planning finishes.
+    If given, `plan` is filled with the assembled dict-form plan
+    (including usage) once the stream ends.
+    Concurrent identical requests wait for the first one's full plan.
+    """
+    plan = {} if plan is None else plan
+    context_json = context_json or context.to_json_bytes()
+
+    async with plan_cache.single_flight(context, context_json) as flight:
+        # Cached, or planned by a concurrent identical request: replay it
+        if flight.plan is not None:
+            plan.update(flight.plan)
+            for step in Plan.steps_from(flight.plan):
+                yield step
+            return
+
+        async for step in _stream_new_plan(context, plan, context_json):
+            yield step
+        await flight.store(plan)
+
+async def _stream_new_plan(context: UserContext, plan: dict, context_json: bytes):
+    # Streams steps from the LLM and assembles them into `plan`
+    response = await _request_plan(context, stream=True, context_json=context_json)
+    calls: dict[int, dict] = {}
+    emitted: set[int] = set()
+    usage = None
+
+    async for chunk in response:
+        if chunk.usage:
+            usage = chunk.usage.model_dump(mode="json")
+        if not chunk.choices:
+            continue
+        for delta in chunk.choices[0].delta.tool_calls or []:
+            call = calls.setdefault(delta.index, {"id": None, "name": "", "arguments": ""})
+            call["id"] = delta.id or call["id"]
+            if delta.function:
+                call["name"] += delta.function.name or ""
+                call["arguments"] += delta.function.arguments or ""
+            if call["name"] != "create_step" or delta.index in emitted:
+                continue
+            # Cheap check before attempting a full parse
+            if call["arguments"].rstrip().endswith("}"):
+                arguments = _parse_arguments(call["arguments"])
+                if arguments is not None:
+                    emitted.add(delta.index)
+                    yield Plan.Step.parse(arguments)
+
+    # Anything the incremental check missed is complete now
+    for index, call in sorted(calls.items()):
+        if call["name"] == "create_step" and index not in emitted:
+            yield Plan.Step.parse(orjson.loads(call["arguments"]))
+
+    plan.update({
+        "choices": [{
+            "message": {
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": call["arguments"]}
+                    }
+                    for _, call in sorted(calls.items())
+                ]
+            }
+        }],
+        "usage": usage
+    })
+
+async def create_plans_batch(contexts: list[UserContext]) -> list[Plan | None]:
+    """
+    Offline planning through the OpenAI Batch API.
+    Half the cost of create_plan, but results arrive within a 24h
+    completion window: use for evals, reprocessing and seed data only,
+    never on a user-facing path.
+    Returns one plan per context, in input order; None for failed requests.
+    """
+    # Index as custom_id: the same user may appear many times
+    lines = [
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _plan_request_body(ctx)
+        })
+        for i, ctx in enumerate(contexts)
+    ]
+    input_file = await client.files.create(
+        file=("plans.jsonl", b"\n".join(lines)),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+    # Poll with exponential backoff until the batch settles
+    delay = BATCH_POLL_INITIAL
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BATCH_POLL_MAX)
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Plan batch {batch.id} ended as {batch.status}")
+
+    plans: list[Plan | None] = [None] * len(contexts)
+    if batch.error_file_id:
+        logger.warning("Plan batch %s has failed requests, see file %s", batch.id, batch.error_file_id)
+    # No output file when every request failed
+    if not batch.output_file_id:
+        return plans
+
+    output = await client.files.content(batch.output_file_id)
+    for line in output.text.splitlines():
+        result = orjson.loads(line)
+        if result.get("error"):
+            continue
+        plans[int(result["custom_id"])] = Plan.from_response(result["response"]["body"])
+    return plans
@@ -1,17 +1,51 @@
-import uuid
+import asyncio
+import contextlib
+import os
+import time
 from typing import Optional, Any
-from fastapi import FastAPI
-from celery import Celery
+import orjson
+import redis.asyncio as aioredis
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from src.common.http import shared_async_client
 
 # Placeholders for types
 from typing import Any as Plan, Any as Context, Any as ApprovalResult
 
 app = FastAPI()
-celery = Celery('tasks', broker='redis://localhost:6379/0')
+redis = aioredis.Redis.from_url("redis://localhost:6379/0")
+
+APPROVAL_TIMEOUT = 3600  # seconds
+
+# New approval requests are published on the broadcast channel and kept
+# in the pending hash (approval_id -> payload) until decided, so /human
+# sockets in any API process see them, including ones raised before the
+# UI connected.
+APPROVAL_REQUESTS_CHANNEL = "approvals:requests"
+PENDING_APPROVALS_KEY = "approvals:pending"
+
+# Decisions are published here by /approve and /reject, so the waiting
+# agent and the API need not share a process.
+def _approval_channel(approval_id: str) -> str:
+    return f"approvals:{approval_id}"
+
+async def _wait_for_decision(pubsub) -> dict:
+    async for message in pubsub.listen():
+        if message["type"] == "message":
+            return orjson.loads(message["data"])
+    # listen() ends when the subscription is gone: no decision will come
+    raise ConnectionError("Approval channel closed before a decision arrived")
 
 class CollaborationLayer:
-    def __init__(self, webhook_url: str):
+    def __init__(self, webhook_url: str, notify_url: Optional[str] = None):
         self.webhook_url = webhook_url
+        # Optional external channel (e.g. Slack webhook) for approval requests
+        self.notify_url = notify_url
+    
+    async def send_notification(self, payload: dict):
+        if not self.notify_url:
+            return
+        response = await shared_async_client.post(self.notify_url, json=payload)
+        response.raise_for_status()
     
     async def request_approval(
         self, 
@@ -20,25 +54,109 @@ class CollaborationLayer:
         reason: str
     ) -> ApprovalResult:
         # Send to human
-        approval_id = str(uuid.uuid4())
+        # 128 random bits, hex: no UUID formatting, shorter keys
+        approval_id = os.urandom(16).hex()
         
         payload = {
             "approval_id": approval_id,
-            "plan": plan.model_dump(),    # Pydantic V2
+            # create_plan returns the dict form; raw responses still work
+            "plan": plan.model_dump() if hasattr(plan, "model_dump") else plan,
             "context": context.model_dump(), # Pydantic V2
             "reason": reason,
             "approve_url": f"{self.webhook_url}/approve/{approval_id}",
-            "reject_url": f"{self.webhook_url}/reject/{approval_id}"
+            "reject_url": f"{self.webhook_url}/reject/{approval_id}",
+            # Lets /human skip requests left behind by a crashed agent
+            "expires_at": time.time() + APPROVAL_TIMEOUT
         }
+        payload_json = orjson.dumps(payload)
         
-        # await self.send_notification(payload) # Implement notification logic
-        
-        # Wait for response (simulated)
-        # result = await self.wait_for_approval(approval_id, timeout=3600)
-        return {"status": "pending", "id": approval_id}
+        pubsub = redis.pubsub()
+        # Subscribe before notifying so a fast decision is not missed
+        await pubsub.subscribe(_approval_channel(approval_id))
+        try:
+            await redis.hset(PENDING_APPROVALS_KEY, approval_id, payload_json)
+            await redis.publish(APPROVAL_REQUESTS_CHANNEL, payload_json)
+            await self.send_notification(payload)
+            # Wait for the human's decision
+            return await asyncio.wait_for(_wait_for_decision(pubsub), APPROVAL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return {"status": "timeout", "id": approval_id}
+        finally:
+            await redis.hdel(PENDING_APPROVALS_KEY, approval_id)
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+@app.on_event("shutdown")
+async def close_clients():
+    await shared_async_client.aclose()
+    await redis.aclose()
+
+async def _resolve(approval_id: str, result: dict) -> bool:
+    # Publish returns the number of subscribers: 0 means nobody is waiting
+    receivers = await redis.publish(_approval_channel(approval_id), orjson.dumps(result))
+    return receivers > 0
+
+async def _pending_approvals() -> list[bytes]:
+    pending = await redis.hgetall(PENDING_APPROVALS_KEY)
+    now = time.time()
+    live, expired = [], []
+    for approval_id, payload_json in pending.items():
+        if orjson.loads(payload_json).get("expires_at", now) < now:
+            expired.append(approval_id)
+        else:
+            live.append(payload_json)
+    if expired:
+        await redis.hdel(PENDING_APPROVALS_KEY, *expired)
+    return live
+
+async def _forward_approval_requests(websocket: WebSocket, pubsub):
+    async for message in pubsub.listen():
+        if message["type"] == "message":
+            await websocket.send_text(message["data"].decode())
+
+@app.websocket("/human")
+async def human_channel(websocket: WebSocket):
+    await websocket.accept()
+    pubsub = redis.pubsub()
+    # Subscribe before the catch-up read so no request falls in between;
+    # one raised meanwhile may arrive twice (UIs dedupe on approval_id)
+    await pubsub.subscribe(APPROVAL_REQUESTS_CHANNEL)
+    forwarder = None
+    try:
+        # Catch up on approvals raised before this UI connected
+        for payload_json in await _pending_approvals():
+            await websocket.send_text(payload_json.decode())
+        forwarder = asyncio.create_task(_forward_approval_requests(websocket, pubsub))
+        while True:
+            # Keep the socket open; decisions arrive via /approve and /reject
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if forwarder is not None:
+            forwarder.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await forwarder
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
 
 @app.post("/approve/{approval_id}")
 async def approve_step(approval_id: str, modifications: Optional[dict] = None):
-    # Resume agent with approval
-    celery.send_task('resume_agent', args=[approval_id, True, modifications])
-    return {"status": "approved"}
\ No newline at end of file
+    # Resume the waiting agent with approval
+    if not await _resolve(approval_id, {"approved": True, "modifications": modifications}):
+        return {"status": "unknown", "id": approval_id}
+    return {"status": "approved"}
+
+@app.post("/reject/{approval_id}")
+async def reject_step(approval_id: str):
+    if not await _resolve(approval_id, {"approved": False, "modifications": None}):
+        return {"status": "unknown", "id": approval_id}
+    return {"status": "rejected"}
+
+if __name__ == "__main__":
+    import uvicorn
+    
+    # uvloop + httptools: pip install "uvicorn[standard]"
+    # CLI equivalent: uvicorn src.collaboration.human_collab:app --loop uvloop --http httptools
+    # loop="uvloop" makes uvicorn create the loop itself; no uvloop.install() needed
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -0,0 +1,3 @@
+# Digest size for every BLAKE3 cache key (plan cache, tool cache).
+# 128 bits is plenty for cache keys and halves the key length.
+KEY_BYTES = 16
@@ -0,0 +1,9 @@
+import httpx
+
+# One keep-alive pool for all outbound HTTP (OpenAI, webhooks).
+# http2=True needs the h2 extra: pip install "httpx[http2]"
+shared_async_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=100, keepalive_expiry=30),
+    timeout=httpx.Timeout(60, connect=5)
+)
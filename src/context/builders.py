@@ -0,0 +1,28 @@
+from typing import Any, Dict, Optional
+from src.context.schema import UserContext
+
+def build_context(
+    user_input: str,
+    pii_detector,
+    *,
+    user_id: str,
+    industry: str,
+    metadata: Optional[Dict[str, Any]] = None
+) -> UserContext:
+    """
+    Layer 1: Context
+    Redacts PII before the context exists, so no sanitized copy is needed.
+    """
+    # Query and metadata share one detector pass
+    redacted = pii_detector.redact_dict({
+        "query": user_input,
+        "metadata": metadata or {}
+    })
+    
+    # Trust boundary: validate what came in from the user
+    return UserContext.model_validate({
+        "user_id": user_id,
+        "industry": industry,
+        "query": redacted["query"],
+        "metadata": redacted["metadata"]
+    })
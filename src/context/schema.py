@@ -1,6 +1,7 @@
 # Using Pydantic (Python) V2
-from pydantic import BaseModel, Field, field_validator
-from typing import Dict, Any
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Dict, Any, Optional
 
 class UserContext(BaseModel):
     user_id: str
@@ -11,9 +12,28 @@ class UserContext(BaseModel):
     # Explicit versioning is a great CAA touch
     schema_version: str = "1.2.0" 
     
+    model_config = ConfigDict(ser_json_bytes='utf8')
+    
     @field_validator('industry')
     @classmethod
     def validate_industry(cls, v: str) -> str:
         if not v.startswith('NAICS'):
             raise ValueError('Industry must be a valid NAICS code')
         return v
+    
+    def to_json_bytes(self, dump: Optional[Dict[str, Any]] = None) -> bytes:
+        # Sorted keys: same context, same bytes (safe as a cache key).
+        # Pass an existing model_dump(mode="json") to skip a second traversal.
+        if dump is None:
+            dump = self.model_dump(mode="json")
+        return orjson.dumps(dump, option=orjson.OPT_SORT_KEYS)
+    
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]) -> 'UserContext':
+        # Skips validation: only for data we serialized ourselves
+        # (checkpoints, caches). User ingress goes through model_validate_json.
+        return cls.model_construct(**data)
+    
+    @classmethod
+    def from_trusted_json(cls, data: bytes) -> 'UserContext':
+        return cls.from_trusted(orjson.loads(data))
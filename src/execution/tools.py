@@ -1,12 +1,24 @@
 import asyncio
-import datetime
-from typing import Protocol, Any
+import copy
+import logging
+import time
+from typing import Protocol, Any, Optional
+
+import orjson
+from blake3 import blake3
+import redis.asyncio as aioredis
+from cachetools import LRUCache
+from redis.exceptions import RedisError
+
+from src.common.hashing import KEY_BYTES
+
+logger = logging.getLogger(__name__)
 
 # Placeholders
 class Context: pass
 class ExecutionResult:
     @staticmethod
-    def failure(msg): return {"status": "error", "msg": msg}
+    def failure(msg): return {"status": "error", "msg": msg, "from_cache": False}
 
 class ToolProtocol(Protocol):
     name: str
@@ -17,13 +29,65 @@ class ToolContract:
     def validate(self, params): return params
     def validate_output(self, res): return res
     timeout: int = 30
+    # Seconds a response may be reused; None for stateful/uncacheable tools
+    cache_ttl: Optional[int] = None
     @classmethod
     def from_mcp(cls, tool): return cls()
 
+# L1: process-local, shared by all executors (keys include the tool name).
+# Values are (expires_at, output).
+_l1_cache: LRUCache = LRUCache(maxsize=1024)
+
 class CAAToolExecutor:
-    def __init__(self, tool: ToolProtocol):
+    def __init__(self, tool: ToolProtocol, cache: Optional[aioredis.Redis] = None):
         self.tool = tool
         self.contract = ToolContract.from_mcp(tool)
+        # L2: optional Redis shared across processes
+        self.cache = cache
+    
+    def _cache_key(self, params: dict) -> Optional[str]:
+        try:
+            payload = self.tool.name.encode() + orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return None  # Params not JSON-serializable: don't cache
+        return "tool:" + blake3(payload).hexdigest(length=KEY_BYTES)
+    
+    async def _cache_get(self, key: str):
+        entry = _l1_cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            # Copy: one caller's mutations must not leak into the cache
+            return True, copy.deepcopy(entry[1])
+        if self.cache is None:
+            return False, None
+        # Best effort: a Redis failure just means calling the tool
+        try:
+            async with self.cache.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                data, ttl_ms = await pipe.execute()
+        except RedisError:
+            logger.warning("Tool cache lookup failed for %s", self.tool.name, exc_info=True)
+            return False, None
+        if data is None:
+            return False, None
+        output = orjson.loads(data)
+        if ttl_ms > 0:
+            # Expire together with the L2 entry, not a fresh full TTL
+            _l1_cache[key] = (time.monotonic() + ttl_ms / 1000, copy.deepcopy(output))
+        return True, output
+    
+    async def _cache_set(self, key: str, output: Any):
+        ttl = self.contract.cache_ttl
+        _l1_cache[key] = (time.monotonic() + ttl, copy.deepcopy(output))
+        if self.cache is not None:
+            try:
+                data = orjson.dumps(output)
+            except TypeError:
+                return  # Not JSON-serializable: keep it in L1 only
+            try:
+                await self.cache.set(key, data, ex=ttl)
+            except RedisError:
+                logger.warning("Tool cache store failed for %s", self.tool.name, exc_info=True)
     
     async def execute(self, params: dict, context: Context) -> Any:
         # 1. Validate against contract
@@ -32,7 +96,16 @@ class CAAToolExecutor:
         except Exception as e:
             return ExecutionResult.failure(f"Contract violation: {e}")
         
-        # 2. Execute with timeout
+        # 2. Serve repeated calls from cache
+        key = None
+        if self.contract.cache_ttl:
+            key = self._cache_key(validated_params)
+        if key is not None:
+            hit, cached = await self._cache_get(key)
+            if hit:
+                return self._result(params, cached, from_cache=True)
+        
+        # 3. Execute with timeout
         try:
             result = await asyncio.wait_for(
                 self.tool.call(validated_params),
@@ -43,14 +116,21 @@ class CAAToolExecutor:
         except Exception as e:
             return ExecutionResult.failure(str(e))
         
-        # 3. Validate output
+        # 4. Validate output
         validated_result = self.contract.validate_output(result)
+        if key is not None:
+            await self._cache_set(key, validated_result)
         
-        # 4. Return structured result
+        # 5. Return structured result
+        return self._result(params, validated_result, from_cache=False)
+    
+    def _result(self, params: dict, output: Any, from_cache: bool) -> dict:
         return {
             "tool": self.tool.name,
             "input": params,
-            "output": validated_result,
+            "output": output,
             # "context_id": context.id,
-            "timestamp": datetime.datetime.now()
-        }
\ No newline at end of file
+            # Integer ns: cheap to take, easy to index; formatted at trace time
+            "timestamp_ns": time.time_ns(),
+            "from_cache": from_cache
+        }
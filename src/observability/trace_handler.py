@@ -1,44 +1,123 @@
+import asyncio
+import datetime
+
 from langfuse import Langfuse
+from src.behavior.planner import Plan
+from src.context import builders
 
 # Initialize Langfuse (assuming env vars are set)
 langfuse = Langfuse()
 
+def _format_ns(timestamp_ns):
+    if timestamp_ns is None:
+        return None
+    return datetime.datetime.fromtimestamp(
+        timestamp_ns / 1e9, tz=datetime.timezone.utc
+    ).isoformat()
+
 class ObservableAgent:
     """
     Mixin/Wrapper to add observability to an existing agent class.
+    The host agent provides pii_detector, user_id and industry.
     """
-    def run_observable(self, user_input: str):
+    def build_context(self, user_input: str, metadata: dict | None = None):
+        return builders.build_context(
+            user_input,
+            self.pii_detector,
+            user_id=self.user_id,
+            industry=self.industry,
+            metadata=metadata
+        )
+
+    async def run_observable(self, user_input: str):
         trace = langfuse.trace(name="agent_execution")
         
         # Context Layer
         with trace.span(name="context_construction") as span:
             context = self.build_context(user_input)
+            # One traversal: the spans, the LLM call and the plan-cache
+            # key all reuse this dump
+            context_dump = context.model_dump(mode="json")
+            context_json = context.to_json_bytes(context_dump)
             span.update(
                 input={"raw": user_input},
-                output=context.model_dump(),
+                output=context_dump,
                 metadata={"version": getattr(context, "schema_version", "1.0")}
             )
         
-        # Behavior Layer
-        with trace.span(name="planning") as span:
-            plan = self.create_plan(context)
-            span.update(
-                input=context.model_dump(),
-                output=plan.model_dump(),
-                metadata={"plan_id": getattr(plan, "id", "unknown")}
-            )
-        
-        # Execution Layer
-        for i, step in enumerate(plan.steps):
-            with trace.span(name=f"execute_step_{i}") as span:
-                result = self.execute_step(step)
+        # Behavior Layer: steps are dispatched as soon as they stream in,
+        # and only wait on the earlier steps they depend on
+        plan = {}
+        steps = []
+        tasks = []
+        try:
+            with trace.span(name="planning") as span:
+                async for step in self.stream_plan(context, plan, context_json=context_json):
+                    i = len(steps)
+                    # Only earlier steps can be waited on: running the step
+                    # anyway would break the order the plan asked for
+                    invalid = [j for j in step.depends_on if not 0 <= j < i]
+                    if invalid:
+                        run = self._reject_step(trace, i, step, ValueError(
+                            f"Step {i} depends on {invalid}, which are not earlier steps"
+                        ))
+                    else:
+                        run = self._execute_observable(
+                            trace, i, step, [tasks[j] for j in step.depends_on]
+                        )
+                    tasks.append(asyncio.create_task(run))
+                    steps.append(step)
                 span.update(
-                    input=step.model_dump(),
-                    output=result.model_dump(),
-                    metadata={"tool": step.tool}
+                    input=context_dump,
+                    output=plan,
+                    metadata={
+                        "plan_id": plan.get("id", "unknown"),
+                        "cached_tokens": Plan.cached_tokens(plan)
+                    }
                 )
+        except BaseException:
+            # Planning failed: stop steps already started for this plan
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        # Execution Layer: every step settles, even if another one fails
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
         
         trace.update(
-            output={"status": "complete"},
-            metadata={"total_steps": len(plan.steps)}
-        )
\ No newline at end of file
+            output={"status": "failed" if errors else "complete"},
+            metadata={"total_steps": len(steps), "failed_steps": len(errors)}
+        )
+        if errors:
+            raise errors[0]
+
+    async def _reject_step(self, trace, i: int, step: Plan.Step, error: Exception):
+        # Fails like any other step, so its dependents fail as well
+        with trace.span(name=f"execute_step_{i}") as span:
+            span.update(
+                input=step.model_dump(),
+                level="ERROR",
+                status_message=str(error),
+                metadata={"tool": step.tool}
+            )
+        raise error
+
+    async def _execute_observable(self, trace, i: int, step: Plan.Step, depends_on: list):
+        if depends_on:
+            await asyncio.gather(*depends_on)
+        with trace.span(name=f"execute_step_{i}") as span:
+            result = await self.execute_step(step)
+            # CAAToolExecutor returns plain dicts
+            output = result.model_dump() if hasattr(result, "model_dump") else result
+            span.update(
+                input=step.model_dump(),
+                output=output,
+                metadata={
+                    "tool": step.tool,
+                    "timestamp": _format_ns(output.get("timestamp_ns")),
+                    "from_cache": output.get("from_cache", False)
+                }
+            )
+        return result
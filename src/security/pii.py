@@ -0,0 +1,106 @@
+import re
+from typing import Any
+
+try:
+    import hyperscan
+except ImportError:  # x86-only wheel; fall back to a single combined regex
+    hyperscan = None
+
+# (type, pattern). Patterns must stay Hyperscan-compatible:
+# no backreferences or lookarounds, and no unescaped "." (see SEPARATOR).
+PATTERNS = [
+    ("EMAIL", r"[A-Za-z0-9_%+-]+(?:\.[A-Za-z0-9_%+-]+)*@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+"),
+    ("SSN", r"\b\d{3}-\d{2}-\d{4}\b"),
+    ("CREDIT_CARD", r"\b(?:\d[ -]?){12,15}\d\b"),
+    ("PHONE", r"(?:\+\d{1,3}[ -]?)?(?:\(\d{3}\)|\b\d{3})[ -]?\d{3}[ -]?\d{4}\b"),
+]
+
+# Joins strings for one batched scan; no pattern can match across it
+SEPARATOR = "\x00"
+
+class PIIDetector:
+    """
+    Redacts PII in a single pass over the text, whatever the number of
+    patterns: one Hyperscan database when available, else one combined
+    regex.
+    """
+    def __init__(self, patterns: list[tuple[str, str]] = PATTERNS):
+        self.types = [name for name, _ in patterns]
+        if hyperscan is not None:
+            self.db = hyperscan.Database()
+            self.db.compile(
+                expressions=[p.encode() for _, p in patterns],
+                ids=list(range(len(patterns))),
+                elements=len(patterns),
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST] * len(patterns)
+            )
+        else:
+            self.regex = re.compile(
+                "|".join(f"(?P<_{i}>{p})" for i, (_, p) in enumerate(patterns)),
+                re.IGNORECASE
+            )
+    
+    def _spans(self, data: bytes) -> list[tuple[int, int, int]]:
+        matches = []
+        
+        def on_match(id, start, end, flags, context):
+            matches.append((start, end, id))
+        
+        self.db.scan(data, match_event_handler=on_match)
+        
+        # Hyperscan reports every match end: merge overlaps into one span
+        merged = []
+        for start, end, id in sorted(matches, key=lambda m: (m[0], -m[1])):
+            if merged and start < merged[-1][1]:
+                last = merged[-1]
+                merged[-1] = (last[0], max(last[1], end), last[2])
+            else:
+                merged.append((start, end, id))
+        return merged
+    
+    def redact(self, text: str) -> str:
+        if hyperscan is None:
+            return self.regex.sub(
+                lambda m: f"[REDACTED_{self.types[int(m.lastgroup[1:])]}]", text
+            )
+        
+        data = text.encode()
+        # Splice back to front so earlier offsets stay valid
+        for start, end, id in reversed(self._spans(data)):
+            data = data[:start] + f"[REDACTED_{self.types[id]}]".encode() + data[end:]
+        return data.decode()
+    
+    def redact_many(self, texts: list[str]) -> list[str]:
+        if not texts:
+            return []
+        if any(SEPARATOR in t for t in texts):
+            return [self.redact(t) for t in texts]
+        return self.redact(SEPARATOR.join(texts)).split(SEPARATOR)
+    
+    def redact_dict(self, data: dict) -> dict:
+        # One scan for every string value in the (nested) dict
+        leaves = []
+        
+        def collect(value: Any):
+            if isinstance(value, str):
+                leaves.append(value)
+            elif isinstance(value, dict):
+                for v in value.values():
+                    collect(v)
+            elif isinstance(value, (list, tuple)):
+                for v in value:
+                    collect(v)
+        
+        collect(data)
+        redacted = iter(self.redact_many(leaves))
+        
+        def rebuild(value: Any):
+            if isinstance(value, str):
+                return next(redacted)
+            if isinstance(value, dict):
+                return {k: rebuild(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return type(value)([rebuild(v) for v in value])
+            return value
+        
+        return rebuild(data)
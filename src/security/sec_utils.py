@@ -15,11 +15,14 @@ class SecurityLayer:
         self.pii = pii_detector
     
     def sanitize_context(self, context: Context) -> Context:
-        sanitized = context.model_copy(deep=True)
-        sanitized.query = self.pii.redact(context.query)
-        # Assuming metadata is a dict
-        sanitized.metadata = self.pii.redact_dict(context.metadata)
-        return sanitized
+        # Contexts from context.builders.build_context are already redacted;
+        # this is for contexts built elsewhere.
+        redacted = self.pii.redact_dict({
+            "query": context.query,
+            "metadata": context.metadata
+        })
+        # Shallow, update-only copy: unchanged fields are reused
+        return context.model_copy(update=redacted)
     
     def authorize_tool(self, tool: str, user: User) -> bool:
         return self.auth.has_permission(user, f"tool.{tool}.execute")
@@ -1,8 +1,11 @@
-import redis
+import msgpack
+import orjson
+import redis.asyncio as aioredis
 from typing import List
 from pydantic import BaseModel
+from src.context.schema import UserContext
 # Assuming these exist in your other modules
-from some.model import Plan, ExecutionResult, Context 
+from some.model import Plan, ExecutionResult
 
 class AgentState(BaseModel):
     agent_id: str
@@ -10,30 +13,41 @@ class AgentState(BaseModel):
     current_step: int
     plan: Plan
     executed_steps: List[ExecutionResult]
-    context_snapshot: Context
+    context_snapshot: UserContext
     
     model_config = {
         "json_schema_extra": {"version": "1.0.0"}
     }
 
+# 1-byte format prefix on stored checkpoints. Unprefixed payloads are
+# legacy JSON checkpoints and still load.
+FORMAT_MSGPACK = b"\x01"
+
 class StateManager:
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(self, redis_client: aioredis.Redis):
         self.redis = redis_client
     
-    def save_checkpoint(self, state: AgentState):
+    async def save_checkpoint(self, state: AgentState):
         key = f"agent:{state.agent_id}:state"
-        self.redis.set(key, state.model_dump_json())
-        self.redis.expire(key, 86400)  # 24h TTL
+        # SET ... EX: value and TTL in one round-trip
+        packed = msgpack.packb(state.model_dump(mode="json"), use_bin_type=True)
+        await self.redis.set(key, FORMAT_MSGPACK + packed, ex=86400)  # 24h TTL
     
-    def load_checkpoint(self, agent_id: str) -> AgentState:
+    async def load_checkpoint(self, agent_id: str) -> AgentState:
         key = f"agent:{agent_id}:state"
-        data = self.redis.get(key)
+        data = await self.redis.get(key)
         if not data:
             return None
-        return AgentState.model_validate_json(data)
+        if data[:1] == FORMAT_MSGPACK:
+            raw = msgpack.unpackb(data[1:], raw=False)
+        else:
+            raw = orjson.loads(data)
+        # The snapshot was validated before it was saved: rehydrate it as-is
+        raw["context_snapshot"] = UserContext.from_trusted(raw["context_snapshot"])
+        return AgentState.model_validate(raw)
     
-    def resume_from_step(self, agent_id: str, step: int):
-        state = self.load_checkpoint(agent_id)
+    async def resume_from_step(self, agent_id: str, step: int):
+        state = await self.load_checkpoint(agent_id)
         if state:
             state.current_step = step
         return state
\ No newline at end of file